@@ -1,17 +1,59 @@
 import streamlit as st
 import io
+import hashlib
+import logging
+import logging.handlers
+import queue
 from collections import Counter
+from pathlib import Path
 from PIL import Image
 from dotenv import load_dotenv
 
-from src.vision import extract_menu_items_from_image, extract_menu_items_from_text, stream_menu_items
-from src.imaging import generate_images_for_menu, generate_image
+from src.vision import MAX_IMAGE_EDGE, draft_to_edge, extract_menu_items_from_image, extract_menu_items_from_text, prepare_image, stream_menu_items
+from src.imaging import MAX_CONCURRENT_IMAGES, generate_images_for_menu, generate_image
 from src.chat import MenuChatAgent
+from src.thumbnails import thumb_data_uri
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Load environment variables from .env file
 load_dotenv()
 
+@st.cache_resource
+def _configure_logging():
+    """
+    Routes log records from the src package through a queue drained by one listener thread.
+
+    Image workers only enqueue records, so they never contend for the stderr lock.
+    Runs once per process; the listener is kept alive by the resource cache. If the
+    cache is cleared ("Clear cache" or an edit to this function), the handler added
+    by the earlier run is still in place and is reused, so records are not duplicated.
+    """
+    src_logger = logging.getLogger('src')
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in src_logger.handlers):
+        return None
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+
+    src_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    src_logger.setLevel(logging.INFO)
+    src_logger.propagate = False
+    return listener
+
+_configure_logging()
+
+@st.cache_data(show_spinner=False)
+def _load_css():
+    """Reads the menu card stylesheet from static/menu.css (once per process)."""
+    return Path(__file__).parent.joinpath('static', 'menu.css').read_text(encoding='utf-8')
+
+def _inject_card_css():
+    """Emits the menu card stylesheet once per script run instead of once per card."""
+    st.markdown(f"<style>{_load_css()}</style>", unsafe_allow_html=True)
+
 def initialize_ui():
     """Initializes the Streamlit page configuration and UI elements."""
     st.set_page_config(
@@ -34,147 +76,90 @@ def initialize_ui():
     
     st.divider()
 
-def display_menu_item(item, col):
-    """Display a single menu item in a card format with proper error handling."""
+    _inject_card_css()
+
+def _card_html(item, pending=False):
+    """
+    Builds the full HTML for one menu card (image plus text) with proper error handling.
+
+    With pending=True the card text is shown next to a "generating" placeholder,
+    so dishes appear as soon as they are read while their images are still in flight.
+    """
+    # Image with error handling
+    if pending:
+        parts = ['<div class="no-image-placeholder">⏳ Generating image...</div>']
+    elif item.get('image_bytes'):
+        try:
+            parts = [f'<img class="menu-item-image" src="{thumb_data_uri(item["image_bytes"])}"/>']
+        except Exception as e:
+            parts = ['<div class="no-image-placeholder">🖼️ Image Error<br><small>Could not load generated image</small></div>']
+    else:
+        # Placeholder for failed image generation
+        parts = ['<div class="no-image-placeholder">🎨 Image Generation Failed<br><small>Try regenerating or check API keys</small></div>']
+
+    # Item name (required field)
+    name = item.get('name', 'Unknown Dish')
+    parts.append(f'<div class="menu-item-name">{name}</div>')
+    
+    # Description if available and not empty
+    description = item.get('description', '').strip()
+    if description:
+        parts.append(f'<div class="menu-item-description">{description}</div>')
+    
+    # Ingredients if available
+    ingredients = item.get('ingredients', [])
+    if ingredients:
+        parts.append(f'<div class="menu-item-description"><i>Ingredients: {", ".join(ingredients)}</i></div>')
+
+    # Nutrition pills if available
+    calories = item.get('estimated_calories')
+    protein = item.get('protein_g')
+    carbs = item.get('carbs_g')
+    fat = item.get('fat_g')
+    if any(v is not None for v in [calories, protein, carbs, fat]):
+        pills = []
+        if calories is not None: pills.append(f'🔥 {calories} kcal')
+        if protein is not None:  pills.append(f'💪 {protein}g protein')
+        if carbs is not None:    pills.append(f'🌾 {carbs}g carbs')
+        if fat is not None:      pills.append(f'🫒 {fat}g fat')
+        pills_html = "".join([f'<span class="nutrition-pill">{p}</span>' for p in pills])
+        parts.append(f'<div class="nutrition-container">{pills_html}</div>')
+
+    # Tags if available
+    tags = item.get('tags', [])
+    if tags:
+        tags_html = "".join([f'<span class="tag">{tag}</span>' for tag in tags])
+        parts.append(f'<div class="tags-container">{tags_html}</div>')
+
+    # Price if available and not empty
+    price = item.get('price', '').strip()
+    if price:
+        parts.append(f'<div class="menu-item-price">{price}</div>')
+
+    return '<div class="menu-card">' + ''.join(parts) + '</div>'
+
+def display_menu_item(item, col, pending=False):
+    """Display a single menu item card (see _card_html) as one markdown element."""
     with col:
-        with st.container():
-            # Create a styled card
-            st.markdown(
-                """
-                <style>
-                .menu-card {
-                    border: 1px solid #e0e0e0;
-                    border-radius: 10px;
-                    padding: 15px;
-                    margin: 10px 0;
-                    background: white;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }
-                .menu-item-name {
-                    font-size: 1.2em;
-                    font-weight: bold;
-                    color: #2e2e2e;
-                    margin: 10px 0 5px 0;
-                }
-                .menu-item-description {
-                    font-size: 0.9em;
-                    color: #666;
-                    margin: 5px 0;
-                    font-style: italic;
-                }
-                .menu-item-price {
-                    font-size: 1.1em;
-                    font-weight: bold;
-                    color: #ff6b35;
-                    margin: 5px 0;
-                }
-                .tags-container {
-                    margin: 10px 0;
-                }
-                .tag {
-                    display: inline-block;
-                    background-color: #e8f5e9;
-                    color: #388e3c;
-                    padding: 3px 8px;
-                    border-radius: 15px;
-                    font-size: 0.8em;
-                    margin-right: 5px;
-                    margin-bottom: 5px;
-                }
-                .no-image-placeholder {
-                    background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-                    border-radius: 8px;
-                    padding: 40px 20px;
-                    text-align: center;
-                    color: #666;
-                    font-style: italic;
-                }
-                .nutrition-container {
-                    display: flex;
-                    flex-wrap: wrap;
-                    gap: 6px;
-                    margin: 8px 0;
-                }
-                .nutrition-pill {
-                    display: inline-flex;
-                    align-items: center;
-                    gap: 3px;
-                    background-color: #f0f4ff;
-                    color: #3b5bdb;
-                    padding: 3px 9px;
-                    border-radius: 20px;
-                    font-size: 0.78em;
-                    font-weight: 600;
-                    border: 1px solid #c5d2f6;
-                }
-                </style>
-                """,
-                unsafe_allow_html=True
-            )
-            
-            # Display image with error handling
-            if item.get('image_bytes'):
-                try:
-                    image = Image.open(io.BytesIO(item['image_bytes']))
-                    st.image(image, width="stretch", caption="")
-                except Exception as e:
-                    st.markdown(
-                        '<div class="no-image-placeholder">🖼️ Image Error<br><small>Could not load generated image</small></div>',
-                        unsafe_allow_html=True
-                    )
-            else:
-                # Placeholder for failed image generation
-                st.markdown(
-                    '<div class="no-image-placeholder">🎨 Image Generation Failed<br><small>Try regenerating or check API keys</small></div>',
-                    unsafe_allow_html=True
-                )
-            
-            # Display item name (required field)
-            name = item.get('name', 'Unknown Dish')
-            st.markdown(f'<div class="menu-item-name">{name}</div>', unsafe_allow_html=True)
-            
-            # Display description if available and not empty
-            description = item.get('description', '').strip()
-            if description:
-                st.markdown(f'<div class="menu-item-description">{description}</div>', unsafe_allow_html=True)
-            
-            # Display ingredients if available
-            ingredients = item.get('ingredients', [])
-            if ingredients:
-                st.markdown(f'<div class="menu-item-description"><i>Ingredients: {", ".join(ingredients)}</i></div>', unsafe_allow_html=True)
-
-            # Display nutrition pills if available
-            calories = item.get('estimated_calories')
-            protein = item.get('protein_g')
-            carbs = item.get('carbs_g')
-            fat = item.get('fat_g')
-            if any(v is not None for v in [calories, protein, carbs, fat]):
-                pills = []
-                if calories is not None: pills.append(f'🔥 {calories} kcal')
-                if protein is not None:  pills.append(f'💪 {protein}g protein')
-                if carbs is not None:    pills.append(f'🌾 {carbs}g carbs')
-                if fat is not None:      pills.append(f'🫒 {fat}g fat')
-                pills_html = "".join([f'<span class="nutrition-pill">{p}</span>' for p in pills])
-                st.markdown(f'<div class="nutrition-container">{pills_html}</div>', unsafe_allow_html=True)
-
-            # Display tags if available
-            tags = item.get('tags', [])
-            if tags:
-                tags_html = "".join([f'<span class="tag">{tag}</span>' for tag in tags])
-                st.markdown(f'<div class="tags-container">{tags_html}</div>', unsafe_allow_html=True)
-
-            # Display price if available and not empty
-            price = item.get('price', '').strip()
-            if price:
-                st.markdown(f'<div class="menu-item-price">{price}</div>', unsafe_allow_html=True)
+        st.markdown(_card_html(item, pending=pending), unsafe_allow_html=True)
+
+def _search_blob(item):
+    """
+    Returns the lowercased text the search box matches against: name, description,
+    ingredients and tags. Fields are newline-separated so a query never matches
+    across two of them.
+    """
+    return '\n'.join([
+        item.get('name', ''),
+        item.get('description', ''),
+        *(item.get('ingredients') or ()),
+        *(item.get('tags') or ()),
+    ]).lower()
 
 def _get_top_tags(menu_items, max_tags=6):
     """Extract the most common tags from menu items for search suggestions."""
-    all_tags = []
-    for item in menu_items:
-        all_tags.extend(item.get('tags', []))
-    # Get the most common tags, title-cased
-    tag_counts = Counter(tag.lower() for tag in all_tags)
+    # Single pass over every item's tags; get the most common ones, title-cased
+    tag_counts = Counter(tag.lower() for item in menu_items for tag in item.get('tags') or ())
     return [tag.title() for tag, _ in tag_counts.most_common(max_tags)]
 
 def display_menu_grid(menu_items_with_images):
@@ -214,25 +199,27 @@ def display_menu_grid(menu_items_with_images):
 
     search_col, chat_btn_col = st.columns([5, 1])
     with search_col:
-        st.session_state.search_query = st.text_input(
-            "Search by dish, ingredient, or flavor...",
-            value=st.session_state.search_query,
-            placeholder="e.g., 'Spicy', 'Tomatoes', 'Pasta'",
-            label_visibility="collapsed"
-        ).lower()
+        # A form commits the query only on Enter / 🔍, so editing it does not rerun the script
+        with st.form("search_form", border=False):
+            query_col, submit_col = st.columns([6, 1])
+            query = query_col.text_input(
+                "Search by dish, ingredient, or flavor...",
+                value=st.session_state.search_query,
+                placeholder="e.g., 'Spicy', 'Tomatoes', 'Pasta'",
+                label_visibility="collapsed"
+            )
+            if submit_col.form_submit_button("🔍", width="stretch"):
+                st.session_state.search_query = query
     with chat_btn_col:
         if st.button("💬 Ask the Menu", width="stretch"):
             st.session_state.show_chat = not st.session_state.get('show_chat', False)
 
     # --- Filter menu items ---
     if st.session_state.search_query:
-        search_query = st.session_state.search_query
+        search_query = st.session_state.search_query.lower()
         filtered_items = [
             item for item in menu_items_with_images
-            if search_query in item.get('name', '').lower() or \
-               search_query in item.get('description', '').lower() or \
-               any(search_query in ingredient.lower() for ingredient in item.get('ingredients', [])) or \
-               any(search_query in tag.lower() for tag in item.get('tags', []))
+            if search_query in (item.get('_search_blob') or _search_blob(item))
         ]
         if not filtered_items:
             st.info(f"No dishes found matching '{search_query}'.")
@@ -242,14 +229,16 @@ def display_menu_grid(menu_items_with_images):
         menu_items_to_display = menu_items_with_images
 
     # --- Grid ---
+    # Emitted as one HTML element: thumbnails travel as cached data URIs
+    # instead of one st.image media upload per card on every rerun
     num_cols = min(3, len(menu_items_to_display))
     if num_cols == 0:
         return
-    cols = st.columns(num_cols)
-
-    for i, item in enumerate(menu_items_to_display):
-        col_index = i % num_cols
-        display_menu_item(item, cols[col_index])
+    cards_html = ''.join(_card_html(item) for item in menu_items_to_display)
+    st.markdown(
+        f'<div class="menu-grid" style="grid-template-columns:repeat({num_cols}, 1fr);">{cards_html}</div>',
+        unsafe_allow_html=True
+    )
 
 def process_menu(menu_items, st_container):
     """
@@ -290,25 +279,139 @@ def validate_menu_items(menu_items):
     if not menu_items:
         return False, "No menu items were extracted. Please try a clearer image or check your text format."
     
-    # Check for valid items
-    valid_items = []
+    # Check for valid items in a single pass, reading each field once
+    valid_count = 0
     issues = []
     
     for i, item in enumerate(menu_items, 1):
-        if not item.get('name', '').strip():
+        name = (item.get('name') or '').strip()
+        if not name:
             issues.append(f"Item {i}: Missing name")
-        elif not item.get('prompt', '').strip():
-            issues.append(f"Item {i} ({item['name']}): Missing image prompt")
+        elif not (item.get('prompt') or '').strip():
+            issues.append(f"Item {i} ({name}): Missing image prompt")
         else:
-            valid_items.append(item)
+            valid_count += 1
     
-    if not valid_items:
-        return False, f"No valid menu items found. Issues: {'; '.join(issues)}"
+    issues_text = '; '.join(issues)
+    if not valid_count:
+        return False, f"No valid menu items found. Issues: {issues_text}"
     
     if issues:
-        st.warning(f"Some items have issues but will proceed with {len(valid_items)} valid items: {'; '.join(issues)}")
+        st.warning(f"Some items have issues but will proceed with {valid_count} valid items: {issues_text}")
     
-    return True, f"Successfully extracted {len(valid_items)} valid menu items!"
+    return True, f"Successfully extracted {valid_count} valid menu items!"
+
+def _decode_uploads(uploaded_files, preview_edge=512, ocr_edge=MAX_IMAGE_EDGE):
+    """
+    Decodes uploaded menu pages once.
+
+    Returns (images, previews): the pages at no less than ocr_edge on the long side,
+    and small copies for the sidebar thumbnails. JPEGs are decoded with draft(), so
+    libjpeg scales them down during decoding instead of inflating every pixel first.
+    """
+    images = []
+    previews = []
+    for f in uploaded_files:
+        img = draft_to_edge(Image.open(io.BytesIO(f.getvalue())), ocr_edge)
+        img.load()
+        preview = img.copy()
+        preview.thumbnail((preview_edge, preview_edge), Image.Resampling.LANCZOS)
+        images.append(img)
+        previews.append(preview)
+    return images, previews
+
+def _content_key(*parts):
+    """Returns a BLAKE2b digest over the raw menu inputs (upload bytes or pasted text)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+def _already_generated(cache_key):
+    """True when the visual menu on screen was built from exactly this input."""
+    return 'visual_menu' in st.session_state and st.session_state.get('_menu_hash') == cache_key
+
+def _stream_visual_menu(contents, stream_area, cache_key=None):
+    """
+    Streams menu items from Gemini and starts each dish's image as soon as it is parsed.
+
+    Images are collected with as_completed, so every card fills in the moment its own
+    image is ready instead of waiting behind slower items that were submitted earlier.
+    Input that was already read is replayed from the extraction cache in src.vision
+    instead of calling Gemini again; cache_key (a digest of the raw upload or text)
+    records which input the menu on screen came from. Cards are drawn into stream_area
+    (an st.empty in the main panel) and cleared once done; results are stored in
+    st.session_state for the grid and chat panel. Dishes with an identical prompt share
+    one image request.
+    """
+    live = stream_area.container()
+    progress_bar = live.progress(0, text="Reading menu...")
+    cols = live.columns(3)
+    futures = {}  # future -> [(placeholder, item, index), ...] for every card it fills
+    by_prompt = {}
+    items_collected = []
+    restaurant_style = ""
+    stream_failed = False
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_IMAGES) as executor:
+        for style_or_empty, item in stream_menu_items(contents):
+            if item is None:  # First yield: restaurant_style
+                restaurant_style = style_or_empty
+                if style_or_empty == "ERROR":
+                    stream_failed = True
+                    st.error("Failed to read menu stream.")
+                    break
+                continue
+
+            items_collected.append(item)
+            idx = len(items_collected) - 1
+            ph = cols[idx % 3].empty()
+            display_menu_item(item, ph.container(), pending=True)
+
+            # Fire image gen immediately for this item, unless the same prompt is already in flight
+            prompt = item.get('prompt')
+            future = by_prompt.get(prompt) if prompt else None
+            if future is None:
+                future = executor.submit(generate_image, item, restaurant_style)
+                futures[future] = []
+                if prompt:
+                    by_prompt[prompt] = future
+            futures[future].append((ph, item, idx))
+
+        # Collect results in completion order
+        total = len(items_collected)
+        visual_menu = [None] * total
+        done = 0
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                error = None
+            except Exception as e:
+                result, error = None, e
+            for ph, item, idx in futures[future]:
+                if result and result is not item:
+                    item['image_bytes'] = result['image_bytes']
+                visual_menu[idx] = item
+                card = ph.container()
+                display_menu_item(item, card)
+                if error:
+                    card.warning(f"⚠️ Error: {error}")
+                done += 1
+            progress_bar.progress(done / max(total, 1), text=f"Generated {done}/{total} images")
+
+    st.session_state.restaurant_style = restaurant_style
+    st.session_state.menu_items = items_collected
+    visual_menu = [v for v in visual_menu if v]
+    # Normalize search text once here rather than on every rerun of the grid
+    for entry in visual_menu:
+        entry['_search_blob'] = _search_blob(entry)
+    st.session_state.visual_menu = visual_menu
+    # Record which input produced this menu, together with the results
+    if cache_key and not stream_failed and visual_menu:
+        st.session_state._menu_hash = cache_key
+    # The interactive grid below takes over from the live preview
+    stream_area.empty()
 
 def main():
     """Main application function."""
@@ -316,6 +419,9 @@ def main():
 
     import os
 
+    # Main-panel slot where cards stream in while a menu is being generated
+    stream_area = st.empty()
+
     # Sidebar for input options
     with st.sidebar:
         # --- API Key Status ---
@@ -355,70 +461,34 @@ def main():
             )
 
             if uploaded_files:
-                images = [Image.open(f) for f in uploaded_files]
+                # Decode the uploads only when they change, not on every rerun
+                cache_key = _content_key(*(f.getvalue() for f in uploaded_files))
+                if st.session_state.get('_uploaded_key') != cache_key:
+                    st.session_state._uploaded_images = _decode_uploads(uploaded_files)
+                    st.session_state._uploaded_key = cache_key
+                images, previews = st.session_state._uploaded_images
+
                 # Show thumbnails in a compact row
-                thumb_cols = st.columns(min(len(images), 4))
-                for i, img in enumerate(images):
+                thumb_cols = st.columns(min(len(previews), 4))
+                for i, img in enumerate(previews):
                     thumb_cols[i % 4].image(img, caption=f"Page {i+1}", width="stretch")
                 
                 if st.button("🍽️ Create Visual Menu", type="primary"):
-                    st.session_state.clear()
-                    st.session_state.processing = True
-
-                    progress_bar = st.progress(0, text="Reading menu...")
-                    cols = st.columns(3)
-                    placeholders = []
-                    futures = []
-                    items_collected = []
-                    restaurant_style = ""
-
-                    with ThreadPoolExecutor(max_workers=5) as executor:
-                        from src.vision import SYSTEM_PROMPT as _SP
-                        # Pass all page images in a single API call for full menu context
-                        contents = [_SP] + images
-                        for style_or_empty, item in stream_menu_items(contents):
-                            if item is None:  # First yield: restaurant_style
-                                restaurant_style = style_or_empty
-                                if style_or_empty == "ERROR":
-                                    st.error("Failed to read menu stream.")
-                                    break
-                                continue
-
-                            items_collected.append(item)
-                            idx = len(items_collected) - 1
-                            col = cols[idx % 3]
-                            ph = col.empty()
-                            ph.markdown(f"**{item.get('name', '')}** — ⏳ generating...")
-                            placeholders.append((ph, item))
-
-                            # Fire image gen immediately for this item
-                            f = executor.submit(generate_image, item, restaurant_style)
-                            futures.append((f, ph, item, idx))
-
-                        # Collect results as they finish
-                        total = len(futures)
-                        done = 0
-                        visual_menu = [None] * total
-                        for future, ph, item, idx in futures:
-                            try:
-                                result = future.result()
-                                if result:
-                                    visual_menu[idx] = result
-                                    image_obj = __import__('PIL.Image', fromlist=['Image']).open(__import__('io').BytesIO(result['image_bytes']))
-                                    ph.image(image_obj, width="stretch", caption=item.get('name', ''))
-                                else:
-                                    visual_menu[idx] = item
-                                    ph.warning(f"⚠️ No image for {item.get('name', '')}")
-                            except Exception as e:
-                                visual_menu[idx] = item
-                                ph.warning(f"⚠️ Error: {e}")
-                            done += 1
-                            progress_bar.progress(done / max(total, 1), text=f"Generated {done}/{total} images")
-
-                    st.session_state.restaurant_style = restaurant_style
-                    st.session_state.menu_items = items_collected
-                    st.session_state.visual_menu = [v for v in visual_menu if v]
-                    progress_bar.empty()
+                    if _already_generated(cache_key):
+                        st.info("This menu is already on screen. Use 🔄 Start Over to generate it again.")
+                    else:
+                        st.session_state.clear()
+                        st.session_state._uploaded_images = (images, previews)
+                        st.session_state._uploaded_key = cache_key
+                        st.session_state.processing = True
+
+                        # Pass all page images in a single API call for full menu context,
+                        # downscaled for OCR while the thumbnails above keep the originals
+                        _stream_visual_menu(
+                            [prepare_image(img) for img in images],
+                            stream_area,
+                            cache_key=cache_key
+                        )
 
         # User input for pasting menu text
         elif input_method == "Paste Text":
@@ -430,59 +500,20 @@ def main():
             )
             
             if st.button("🍽️ Create Visual Menu", type="primary"):
-                if menu_text.strip():
+                cache_key = _content_key(menu_text.strip())
+                if not menu_text.strip():
+                    st.warning("Please enter some menu text first.")
+                elif _already_generated(cache_key):
+                    st.info("This menu is already on screen. Use 🔄 Start Over to generate it again.")
+                else:
                     st.session_state.clear()
                     st.session_state.processing = True
 
-                    progress_bar = st.progress(0, text="Reading menu...")
-                    cols_text = st.columns(3)
-                    futures_text = []
-                    items_text = []
-                    restaurant_style = ""
-
-                    with ThreadPoolExecutor(max_workers=5) as executor:
-                        text_contents = f"{__import__('src.vision', fromlist=['SYSTEM_PROMPT']).SYSTEM_PROMPT}\n\nHere is the menu text to analyze:\n{menu_text}"
-                        for style_or_empty, item in stream_menu_items(text_contents):
-                            if item is None:
-                                restaurant_style = style_or_empty
-                                if style_or_empty == "ERROR":
-                                    st.error("Failed to read menu stream.")
-                                    break
-                                continue
-
-                            items_text.append(item)
-                            idx = len(items_text) - 1
-                            ph = cols_text[idx % 3].empty()
-                            ph.markdown(f"**{item.get('name', '')}** — ⏳ generating...")
-
-                            f = executor.submit(generate_image, item, restaurant_style)
-                            futures_text.append((f, ph, item, idx))
-
-                        total_t = len(futures_text)
-                        done_t = 0
-                        visual_menu_text = [None] * total_t
-                        for future, ph, item, idx in futures_text:
-                            try:
-                                result = future.result()
-                                if result:
-                                    visual_menu_text[idx] = result
-                                    image_obj = __import__('PIL.Image', fromlist=['Image']).open(__import__('io').BytesIO(result['image_bytes']))
-                                    ph.image(image_obj, width="stretch", caption=item.get('name', ''))
-                                else:
-                                    visual_menu_text[idx] = item
-                                    ph.warning(f"⚠️ No image for {item.get('name', '')}")
-                            except Exception as e:
-                                visual_menu_text[idx] = item
-                                ph.warning(f"⚠️ Error: {e}")
-                            done_t += 1
-                            progress_bar.progress(done_t / max(total_t, 1), text=f"Generated {done_t}/{total_t} images")
-
-                    st.session_state.restaurant_style = restaurant_style
-                    st.session_state.menu_items = items_text
-                    st.session_state.visual_menu = [v for v in visual_menu_text if v]
-                    progress_bar.empty()
-                else:
-                    st.warning("Please enter some menu text first.")
+                    _stream_visual_menu(
+                        menu_text,
+                        stream_area,
+                        cache_key=cache_key
+                    )
 
     if "visual_menu" in st.session_state:
         display_menu_grid(st.session_state.visual_menu)
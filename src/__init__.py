@@ -2,8 +2,11 @@
 Menu-Vision Core Modules
 
 This package contains the core functionality for Menu-Vision:
+- client.py: Shared Google GenAI client, one per API key
 - vision.py: Google Gemini integration for menu OCR and extraction
 - imaging.py: Google Imagen 4 integration for food image generation
+- imaging_cache.py: Persistent content-addressed cache of generated images
+- thumbnails.py: Memoized card thumbnails for generated images
 """
 
 __version__ = "2.0.0"
\ No newline at end of file
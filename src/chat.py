@@ -1,7 +1,10 @@
 import os
-import json
-from google import genai
+import logging
+import orjson
 from google.genai import types
+from src.client import get_client
+
+logger = logging.getLogger(__name__)
 
 
 CHAT_SYSTEM_INSTRUCTION = """You are a friendly and knowledgeable menu assistant for a restaurant.
@@ -31,10 +34,15 @@ class MenuChatAgent:
         if not api_key:
             raise ValueError("Google API Key not found.")
 
-        self._client = genai.Client(api_key=api_key)
+        self._client = get_client(api_key)
 
-        # Build the system prompt with menu data silently injected
-        menu_json = json.dumps(menu_items, indent=2, ensure_ascii=False)
+        # Build the system prompt with menu data silently injected, leaving out generated
+        # image data and private keys the UI attaches to items (e.g. '_search_blob')
+        public_items = [
+            {key: value for key, value in item.items() if key != 'image_bytes' and not key.startswith('_')}
+            for item in menu_items
+        ]
+        menu_json = orjson.dumps(public_items, option=orjson.OPT_INDENT_2).decode('utf-8')
         style_context = f"\nRestaurant style/vibe: {restaurant_style}" if restaurant_style else ""
         system_prompt = (
             f"{CHAT_SYSTEM_INSTRUCTION}{style_context}\n\n"
@@ -63,4 +71,5 @@ class MenuChatAgent:
             response = self._chat.send_message(question)
             return response.text
         except Exception as e:
+            logger.error("Chat request failed: %s", e)
             return f"Sorry, I couldn't process that question. ({e})"
@@ -0,0 +1,16 @@
+import functools
+from typing import Optional
+from google import genai
+
+
+@functools.lru_cache(maxsize=4)
+def get_client(api_key: Optional[str]) -> genai.Client:
+    """
+    Get the shared Gemini API client for an API key, creating it on first use.
+
+    Memoized per key, so menu extraction, chat and image generation reuse one client
+    and its pooled connections, and a key entered at runtime in the sidebar gets its own.
+    """
+    if not api_key:
+        raise ValueError("Google API Key not found. Please set the GOOGLE_API_KEY environment variable.")
+    return genai.Client(api_key=api_key)
@@ -1,74 +1,240 @@
 import os
+import re
+import asyncio
+import logging
 from google import genai
 from google.genai import types
 from typing import Optional, Dict, Any, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from src import imaging_cache
+from src.client import get_client
 
+logger = logging.getLogger(__name__)
 
-def _get_client():
-    """Get or create a Gemini API client."""
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        raise ValueError("Google API Key not found. Please set the GOOGLE_API_KEY environment variable.")
-    return genai.Client(api_key=api_key)
+# Upper bound on Imagen requests in flight at once
+MAX_CONCURRENT_IMAGES = 5
+
+# Imagen request settings are the same for every dish, so the config is built once
+IMAGEN_MODEL = 'imagen-4.0-fast-generate-001'
+_IMAGEN_CONFIG = types.GenerateImagesConfig(
+    number_of_images=1,
+    aspect_ratio='1:1',
+)
+_IMAGEN_PARAMS = _IMAGEN_CONFIG.model_dump(mode='json', exclude_none=True)
+
+
+def _build_prompt(menu_item: Dict[str, Any], restaurant_style: str) -> Optional[str]:
+    """Returns the Imagen prompt for a menu item, or None if the item has no prompt."""
+    prompt = str(menu_item.get('prompt', ''))
+    if not prompt:
+        logger.warning("No prompt found for menu item: %s", menu_item.get('name', 'Unknown'))
+        return None
+
+    # Append restaurant style for visual consistency across all generated images
+    if restaurant_style:
+        prompt = f"{prompt} Shot in the style of: {restaurant_style}."
+    return prompt
+
+
+_SENTENCE_BREAK_RE = re.compile(r'[.!?]+\s+')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+def _segment_key(prompt: str) -> str:
+    """
+    Canonical form of a prompt for cache lookups.
+
+    The prompt is split into sentences, and each is lowercased with punctuation turned
+    into spaces and whitespace collapsed. Punctuation is never just deleted, so "3.5 oz"
+    and "35 oz" or "1/2" and "12" stay distinct. The sorted, de-duplicated sentences
+    are then joined.
+    Prompts that differ only in casing, punctuation or sentence order therefore share
+    one cached image. That is common when the same boilerplate photography sentences
+    surround a recurring dish.
+    """
+    segments = {
+        ' '.join(_PUNCTUATION_RE.sub(' ', segment).lower().split())
+        for segment in _SENTENCE_BREAK_RE.split(prompt)
+    }
+    return '\x1f'.join(sorted(segment for segment in segments if segment))
+
+
+def _image_cache_key(prompt: str) -> str:
+    """Content address of an Imagen request for the image cache."""
+    return imaging_cache.cache_key(IMAGEN_MODEL, _segment_key(prompt), _IMAGEN_PARAMS)
+
+
+def _attach_cached(menu_item: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+    """Attaches a previously generated image from the disk cache, or returns None on a miss."""
+    image_bytes = imaging_cache.get(key)
+    if image_bytes is None:
+        return None
+    menu_item['image_bytes'] = image_bytes
+    logger.info("♻️ Reused cached image for: %s", menu_item.get('name', 'Unknown'))
+    return menu_item
+
+
+def _attach_image(menu_item: Dict[str, Any], response, key: str) -> Optional[Dict[str, Any]]:
+    """Stores the generated image on the menu item (in place) and in the cache, and returns it, or None."""
+    if response.generated_images:
+        # Attach the image data to the menu item itself
+        menu_item['image_bytes'] = response.generated_images[0].image.image_bytes
+        imaging_cache.put(key, menu_item['image_bytes'])
+        logger.info("✅ Successfully generated image for: %s", menu_item.get('name', 'Unknown'))
+        return menu_item
+
+    logger.warning("❌ Failed to generate image for: %s", menu_item.get('name', 'Unknown'))
+    return None
 
 
 def generate_image(menu_item: Dict[str, Any], restaurant_style: str = "") -> Optional[Dict[str, Any]]:
     """
     Generates an image for a menu item using Google Imagen 4 Fast.
 
+    Images are cached on disk by model, prompt and request settings, so a dish seen
+    in an earlier run is returned without calling the API.
+
     Args:
         menu_item: Dictionary containing menu item data with 'name' and 'prompt'
         restaurant_style: Optional style string to enforce visual consistency across all dishes.
 
     Returns:
-        Dictionary with menu item data plus 'image_bytes' field, or None if generation fails
+        The same menu_item dictionary with an 'image_bytes' field added (updated in place,
+        no copy is made), or None if generation fails
     """
     try:
-        client = _get_client()
-
-        # Extract the prompt from the menu item
-        prompt = str(menu_item.get('prompt', ''))
+        prompt = _build_prompt(menu_item, restaurant_style)
         if not prompt:
-            print(f"No prompt found for menu item: {menu_item.get('name', 'Unknown')}")
             return None
 
-        # Append restaurant style for visual consistency across all generated images
-        if restaurant_style:
-            prompt = f"{prompt} Shot in the style of: {restaurant_style}."
+        key = _image_cache_key(prompt)
+        cached = _attach_cached(menu_item, key)
+        if cached:
+            return cached
 
-        print(f"🎨 Generating image for: {menu_item.get('name', 'Unknown')}")
+        client = get_client(os.getenv('GOOGLE_API_KEY'))
+        logger.info("🎨 Generating image for: %s", menu_item.get('name', 'Unknown'))
 
         # Generate image using Imagen 4 Fast
         response = client.models.generate_images(
-            model='imagen-4.0-fast-generate-001',
+            model=IMAGEN_MODEL,
             prompt=prompt,
-            config=types.GenerateImagesConfig(
-                number_of_images=1,
-                aspect_ratio='1:1',
-            )
+            config=_IMAGEN_CONFIG
         )
+        return _attach_image(menu_item, response, key)
 
-        if response.generated_images:
-            image_bytes = response.generated_images[0].image.image_bytes
+    except Exception as e:
+        logger.error("❌ Error generating image for %s: %s", menu_item.get('name', 'Unknown'), e)
+        return None
 
-            # Return the menu item with image data
-            result = menu_item.copy()
-            result['image_bytes'] = image_bytes
-            print(f"✅ Successfully generated image for: {menu_item.get('name', 'Unknown')}")
-            return result
 
-        print(f"❌ Failed to generate image for: {menu_item.get('name', 'Unknown')}")
+async def generate_image_async(menu_item: Dict[str, Any], restaurant_style: str = "",
+                               client: Optional[genai.Client] = None) -> Optional[Dict[str, Any]]:
+    """
+    Async counterpart of generate_image, using the SDK's native aio client.
+
+    Args:
+        menu_item: Dictionary containing menu item data with 'name' and 'prompt'
+        restaurant_style: Optional style string to enforce visual consistency across all dishes.
+        client: Client to issue the request with (defaults to the shared client)
+
+    Returns:
+        The same menu_item dictionary with an 'image_bytes' field added, or None if generation fails
+    """
+    prompt = _build_prompt(menu_item, restaurant_style)
+    if not prompt:
         return None
+    try:
+        client = client or get_client(os.getenv('GOOGLE_API_KEY'))
+    except Exception as e:
+        logger.error("❌ Error generating image for %s: %s", menu_item.get('name', 'Unknown'), e)
+        return None
+    return await _request_image_async(client, menu_item, prompt)
+
+
+async def _request_image_async(client: genai.Client, menu_item: Dict[str, Any], prompt: str) -> Optional[Dict[str, Any]]:
+    """Issues the Imagen request for an already prepared prompt, unless the image is cached."""
+    try:
+        # Cache reads and writes are blocking file I/O on MB-sized images, so they run
+        # in a worker thread to keep the event loop free for the other requests
+        key = _image_cache_key(prompt)
+        cached = await asyncio.to_thread(_attach_cached, menu_item, key)
+        if cached:
+            return cached
+
+        logger.info("🎨 Generating image for: %s", menu_item.get('name', 'Unknown'))
+
+        response = await client.aio.models.generate_images(
+            model=IMAGEN_MODEL,
+            prompt=prompt,
+            config=_IMAGEN_CONFIG
+        )
+        return await asyncio.to_thread(_attach_image, menu_item, response, key)
 
     except Exception as e:
-        print(f"❌ Error generating image for {menu_item.get('name', 'Unknown')}: {e}")
+        logger.error("❌ Error generating image for %s: %s", menu_item.get('name', 'Unknown'), e)
         return None
 
 
+async def _generate_all(menu_items: list, restaurant_style: str, on_progress: Optional[Callable]) -> list:
+    """Runs generate_image_async for every item, at most MAX_CONCURRENT_IMAGES at a time."""
+    # asyncio.run() starts a fresh event loop per menu, and the SDK's async transport is
+    # bound to the loop it first runs on, so each run gets its own client
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        logger.error("❌ Google API Key not found. Please set the GOOGLE_API_KEY environment variable.")
+        return []
+    client = genai.Client(api_key=api_key)
+    try:
+        return await _generate_with(client, menu_items, restaurant_style, on_progress)
+    finally:
+        # Close the run's connection pool before asyncio.run() tears down its loop
+        await client.aio.aclose()
+
+
+async def _generate_with(client: genai.Client, menu_items: list, restaurant_style: str,
+                         on_progress: Optional[Callable]) -> list:
+    """Generates every unique image with the given client; see _generate_all."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_IMAGES)
+
+    async def _one(items, prompt):
+        async with semaphore:
+            return items, await _request_image_async(client, items[0], prompt)
+
+    # Validate and build every prompt in one pass up front. Items whose prompts
+    # normalise to the same cache key (a dish listed under two headings, size
+    # variants) are grouped, so each unique image is requested once.
+    total = len(menu_items)
+    completed = 0
+    groups = {}
+    for item in menu_items:
+        prompt = _build_prompt(item, restaurant_style)
+        if not prompt:
+            completed += 1
+            if on_progress:
+                on_progress(completed, total, item.get('name', 'Unknown'))
+            continue
+        groups.setdefault(_image_cache_key(prompt), (prompt, []))[1].append(item)
+
+    tasks = [asyncio.ensure_future(_one(items, prompt)) for prompt, items in groups.values()]
+
+    # Collect results as they complete, fanning each image out to every item that shares it
+    successful_results = []
+    for next_done in asyncio.as_completed(tasks):
+        items, result = await next_done
+        for item in items:
+            completed += 1
+            if result:
+                item['image_bytes'] = result['image_bytes']
+                successful_results.append(item)
+            if on_progress:
+                on_progress(completed, total, item.get('name', 'Unknown'))
+
+    return successful_results
+
+
 def generate_images_for_menu(menu_items: list, restaurant_style: str = "", on_progress: Optional[Callable] = None) -> list:
     """
-    Generates images for all menu items concurrently.
+    Generates images for all menu items concurrently on a single event loop.
 
     Args:
         menu_items: List of menu item dictionaries
@@ -83,33 +249,10 @@ def generate_images_for_menu(menu_items: list, restaurant_style: str = "", on_pr
         return []
 
     total = len(menu_items)
-    print(f"🚀 Starting image generation for {total} menu items (style: '{restaurant_style}')...")
+    logger.info("🚀 Starting image generation for %d menu items (style: '%s')...", total, restaurant_style)
 
-    successful_results = []
-    completed = 0
-
-    # Use ThreadPoolExecutor for concurrent generation
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        # Submit all tasks, passing restaurant_style to each
-        future_to_item = {
-            executor.submit(generate_image, item, restaurant_style): item
-            for item in menu_items
-        }
-
-        # Collect results as they complete
-        for future in as_completed(future_to_item):
-            completed += 1
-            item = future_to_item[future]
-
-            try:
-                result = future.result()
-                if result:
-                    successful_results.append(result)
-            except Exception as e:
-                print(f"❌ Error generating image for {item.get('name', 'Unknown')}: {e}")
-
-            if on_progress:
-                on_progress(completed, total, item.get('name', 'Unknown'))
+    successful_results = asyncio.run(_generate_all(menu_items, restaurant_style, on_progress))
 
-    print(f"✅ Successfully generated {len(successful_results)} out of {total} images")
-    return successful_results
\ No newline at end of file
+    logger.info("✅ Successfully generated %d out of %d images (image cache: %s)",
+                len(successful_results), total, imaging_cache.stats())
+    return successful_results
@@ -0,0 +1,208 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import orjson
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# On-disk caches live under .cache in the project root; generated images go in
+# .cache/images, one file per key
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+CACHE_DIR = os.path.join(CACHE_ROOT, 'images')
+
+# Entries older than this are treated as misses and removed
+DEFAULT_EXPIRE_SECONDS = 30 * 86400
+
+# Total size a cache directory may reach before its oldest entries are evicted
+DEFAULT_SIZE_LIMIT = 512 * 1024 * 1024
+
+# Minimum time between full directory sweeps triggered by put()
+SWEEP_INTERVAL_SECONDS = 600
+
+
+def cache_key(model: str, prompt: str, params: Dict[str, Any]) -> str:
+    """
+    Returns the content address for one image request.
+
+    Args:
+        model: Image model name
+        prompt: Final prompt text sent to the model
+        params: JSON-serialisable request parameters (aspect ratio, image count, ...)
+
+    Returns:
+        str: SHA-256 hex digest of the canonical (sorted-key) JSON of all three.
+    """
+    payload = orjson.dumps({'model': model, 'prompt': prompt, 'params': params}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+class DiskCache:
+    """
+    A persistent bytes cache with one file per key.
+
+    Writes go to a temporary file that is renamed into place, so concurrent readers
+    (the app generates images from several threads) never see a partial entry.
+    Any filesystem error is logged and treated as a miss: the cache can only save
+    work, never break generation.
+
+    put() keeps the directory bounded. It sweeps out expired entries, and evicts the
+    oldest ones once the total size passes size_limit. The sweep runs again when the
+    bytes written since the last sweep would take the total over the limit, or after
+    SWEEP_INTERVAL_SECONDS, so most writes do not list the directory at all.
+    """
+
+    def __init__(self, directory: str, expire: int = DEFAULT_EXPIRE_SECONDS,
+                 size_limit: int = DEFAULT_SIZE_LIMIT):
+        self.directory = directory
+        self.expire = expire
+        self.size_limit = size_limit
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._size = None  # total size as of the last sweep plus later writes; None until swept
+        self._last_sweep = 0.0
+
+    def _path(self, key: str) -> str:
+        # Fan out by key prefix so no single directory grows unbounded
+        return os.path.join(self.directory, key[:2], key)
+
+    def _record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the stored bytes for key, or None if missing or expired."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.expire:
+                os.remove(path)
+                self._record(False)
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._record(False)
+            return None
+        except OSError as e:
+            logger.warning("Cache read failed for %s in %s: %s", key, self.directory, e)
+            self._record(False)
+            return None
+
+        self._record(True)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Stores data under key, replacing any existing entry."""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning("Cache write failed for %s in %s: %s", key, self.directory, e)
+            return
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            due = (self._size is None or self._size > self.size_limit
+                   or time.monotonic() - self._last_sweep > SWEEP_INTERVAL_SECONDS)
+        if due:
+            self.sweep()
+
+    def sweep(self):
+        """
+        Removes expired entries and stray temp files, then evicts the oldest entries
+        until the cache is back under 90% of size_limit.
+
+        A sweep already running in another thread makes this call a no-op.
+        """
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.time()
+            entries = []
+            try:
+                with os.scandir(self.directory) as shards:
+                    for shard in shards:
+                        if not shard.is_dir():
+                            continue
+                        with os.scandir(shard.path) as files:
+                            for entry in files:
+                                try:
+                                    stat = entry.stat()
+                                except OSError:
+                                    continue
+                                # Temp files older than an hour were left by a crashed write
+                                stale_tmp = entry.name.endswith('.tmp') and now - stat.st_mtime > 3600
+                                if stale_tmp or now - stat.st_mtime > self.expire:
+                                    self._remove(entry.path)
+                                elif not entry.name.endswith('.tmp'):
+                                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Cache sweep failed for %s: %s", self.directory, e)
+                return
+
+            total = sum(size for _, size, _ in entries)
+            if total > self.size_limit:
+                target = self.size_limit * 9 // 10
+                for _, size, path in sorted(entries):
+                    if total <= target:
+                        break
+                    if self._remove(path):
+                        total -= size
+
+            with self._lock:
+                self._size = total
+                self._last_sweep = time.monotonic()
+        finally:
+            self._sweep_lock.release()
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counts since this cache was created."""
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses}
+
+
+# Process-wide cache used by src.imaging
+_cache = DiskCache(CACHE_DIR)
+
+
+def get(key: str) -> Optional[bytes]:
+    """Looks up key in the shared image cache."""
+    return _cache.get(key)
+
+
+def put(key: str, data: bytes):
+    """Stores data under key in the shared image cache."""
+    _cache.put(key, data)
+
+
+def stats() -> Dict[str, int]:
+    """Hit and miss counts of the shared image cache."""
+    return _cache.stats
@@ -0,0 +1,48 @@
+import io
+import base64
+import hashlib
+import threading
+from PIL import Image
+
+# Card thumbnails kept in memory; sized for menus with repeated dishes. Entries hold
+# only the thumbnail's data URI (tens of KB), so a full cache stays around 10 MB.
+MAX_CACHED_THUMBNAILS = 128
+
+# BLAKE2b digest of the image bytes -> data URI, oldest first
+_thumbnails = {}
+_thumbnails_lock = threading.Lock()
+
+
+def _decoded_thumb(raw: bytes, target_w: int = 512) -> bytes:
+    """Decodes generated image bytes and returns a card-sized JPEG thumbnail."""
+    image = Image.open(io.BytesIO(raw))
+    image.thumbnail((target_w, target_w * 2), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    image.convert('RGB').save(buf, format='JPEG', quality=82, optimize=True)
+    return buf.getvalue()
+
+
+def thumb_data_uri(raw: bytes) -> str:
+    """
+    Returns the card thumbnail for raw image bytes as a base64 data URI.
+
+    Streamlit re-executes app.py in a fresh module on every rerun, so the memo lives
+    here: imported modules stay loaded, and reruns (search submits, button presses,
+    chat messages) hit the cache instead of decoding and re-encoding every image.
+    It is keyed on a digest of the bytes rather than the bytes themselves, so it never
+    keeps full-size generated images alive after their menus are gone. Dishes with
+    identical image bytes share one thumbnail.
+    """
+    key = hashlib.blake2b(raw, digest_size=16).digest()
+    with _thumbnails_lock:
+        uri = _thumbnails.get(key)
+    if uri is not None:
+        return uri
+
+    uri = "data:image/jpeg;base64," + base64.b64encode(_decoded_thumb(raw)).decode('ascii')
+    with _thumbnails_lock:
+        _thumbnails.pop(key, None)
+        if len(_thumbnails) >= MAX_CACHED_THUMBNAILS:
+            _thumbnails.pop(next(iter(_thumbnails)))  # evict the oldest entry
+        _thumbnails[key] = uri
+    return uri
@@ -1,7 +1,19 @@
 import os
-import json
-from google import genai
+import io
+import re
+import hashlib
+import logging
+import threading
+import orjson
 from google.genai import types
+from PIL import Image
+from src.client import get_client
+from src.imaging_cache import CACHE_ROOT, DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Gemini model used for menu reading
+MENU_MODEL = 'gemini-2.5-flash'
 
 # Enhanced system prompt to guide the AI model in extracting menu items and generating image prompts
 SYSTEM_PROMPT = """
@@ -66,74 +78,296 @@ Important rules:
 - Return ONLY the JSON object, no markdown formatting or additional text
 """
 
-def _extract_menu_items(contents):
+# Longest image edge sent to Gemini; beyond this, menu text gains no legibility
+# while upload size and image token count keep growing
+MAX_IMAGE_EDGE = 1568
+
+# Text-menu preamble; SYSTEM_PROMPT itself always travels as the system instruction
+_TEXT_PREFIX = "Here is the menu text to analyze:\n"
+
+# Structured-output schema matching SYSTEM_PROMPT's format. Gemini is constrained to
+# emit exactly this shape (no fences or prose), and restaurant_style is ordered first
+# so stream_menu_items can show it before the first item arrives.
+_STRING = types.Schema(type=types.Type.STRING)
+_INTEGER = types.Schema(type=types.Type.INTEGER)
+_ITEM_FIELDS = ['name', 'description', 'price', 'ingredients', 'tags', 'prompt',
+                'estimated_calories', 'protein_g', 'carbs_g', 'fat_g']
+_REQUIRED_FIELDS = frozenset(_ITEM_FIELDS)
+MENU_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        'restaurant_style': _STRING,
+        'items': types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    'name': _STRING,
+                    'description': _STRING,
+                    'price': _STRING,
+                    'ingredients': types.Schema(type=types.Type.ARRAY, items=_STRING),
+                    'tags': types.Schema(type=types.Type.ARRAY, items=_STRING),
+                    'prompt': _STRING,
+                    'estimated_calories': _INTEGER,
+                    'protein_g': _INTEGER,
+                    'carbs_g': _INTEGER,
+                    'fat_g': _INTEGER,
+                },
+                required=_ITEM_FIELDS,
+                property_ordering=_ITEM_FIELDS,
+            ),
+        ),
+    },
+    required=['restaurant_style', 'items'],
+    property_ordering=['restaurant_style', 'items'],
+)
+_BATCH_SCHEMA = types.Schema(type=types.Type.ARRAY, items=MENU_SCHEMA)
+
+# Extraction results depend on the exact prompt and schema, so their digest is part
+# of every cache key
+_PROMPT_DIGEST = hashlib.sha256(
+    SYSTEM_PROMPT.encode('utf-8') + b"\x1f" + MENU_SCHEMA.model_dump_json(exclude_none=True).encode('utf-8')
+).hexdigest()
+
+# Parsed extractions keyed by request content hash: a bounded in-process layer over
+# a disk cache that survives restarts. Set GEMINI_NOCACHE=1 to bypass both.
+MAX_MEMO_EXTRACTIONS = 256
+_extraction_memo = {}
+_extraction_memo_lock = threading.Lock()
+_extraction_disk = DiskCache(os.path.join(CACHE_ROOT, 'gemini'), size_limit=64 * 1024 * 1024)
+
+def _menu_request(menu_contents, schema=MENU_SCHEMA):
+    """
+    Builds the (contents, config) pair for a menu extraction request.
+
+    Args:
+        menu_contents: Menu page images (list) or menu text (str), without SYSTEM_PROMPT.
+        schema: Response schema the output is constrained to.
+
+    Returns:
+        tuple: contents and GenerateContentConfig carrying SYSTEM_PROMPT as system_instruction.
+    """
+    if isinstance(menu_contents, str):
+        contents = _TEXT_PREFIX + menu_contents
+    else:
+        contents = menu_contents
+
+    # The prompt goes in the system-instruction channel rather than the user turn, so
+    # every request carries an identical prefix that Gemini's implicit prefix caching
+    # can reuse. (It is too short for an explicit context cache on MENU_MODEL.)
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema,
+        system_instruction=SYSTEM_PROMPT
+    )
+    return contents, config
+
+def _extraction_key(menu_contents):
+    """
+    Returns the cache key for an extraction request, or None if it cannot be hashed
+    or caching is disabled with GEMINI_NOCACHE=1.
+
+    The key covers the model, the system prompt and the menu itself: the text, or
+    each page's raw pixels (PIL images) or encoded bytes.
+    """
+    if os.getenv('GEMINI_NOCACHE') == '1':
+        return None
+    digest = hashlib.sha256(f"{MENU_MODEL}\x1f{_PROMPT_DIGEST}\x1f".encode('utf-8'))
+    if isinstance(menu_contents, str):
+        digest.update(b"text\x1f")
+        digest.update(menu_contents.encode('utf-8'))
+        return digest.hexdigest()
+
+    for page in menu_contents:
+        if isinstance(page, Image.Image):
+            digest.update(f"image\x1f{page.mode}\x1f{page.size}\x1f".encode('utf-8'))
+            digest.update(page.tobytes())
+        elif isinstance(page, (bytes, bytearray)):
+            digest.update(b"bytes\x1f")
+            digest.update(page)
+        else:
+            return None
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+def _remember_extraction(key, data):
+    """Stores serialised extraction JSON in the in-process layer, evicting the oldest entry."""
+    with _extraction_memo_lock:
+        _extraction_memo.pop(key, None)
+        if len(_extraction_memo) >= MAX_MEMO_EXTRACTIONS:
+            _extraction_memo.pop(next(iter(_extraction_memo)))
+        _extraction_memo[key] = data
+
+def _cached_extraction(key):
+    """Returns (restaurant_style, items) for a cached extraction, or None on a miss."""
+    with _extraction_memo_lock:
+        data = _extraction_memo.get(key)
+    if data is None:
+        data = _extraction_disk.get(key)
+        if data is None:
+            return None
+        _remember_extraction(key, data)
+
+    # Decode on every hit so callers get fresh item dicts they are free to mutate.
+    # A damaged entry counts as a miss; the next successful extraction overwrites it.
+    try:
+        cached = orjson.loads(data)
+        return cached['restaurant_style'], cached['items']
+    except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+        logger.warning("Ignoring damaged cached extraction %s: %s", key, e)
+        with _extraction_memo_lock:
+            _extraction_memo.pop(key, None)
+        return None
+
+def _extract_menu_items(menu_contents):
+    """
+    Extracts menu items, reusing an earlier result for identical input.
+
+    Args:
+        menu_contents: Menu page images (list) or menu text (str).
+
+    Returns:
+        tuple: (restaurant_style: str, items: list) or ("", []) on failure.
+    """
+    key = _extraction_key(menu_contents)
+    if key:
+        cached = _cached_extraction(key)
+        if cached:
+            return cached
+
+    restaurant_style, menu_items = _request_menu_items(menu_contents)
+    _store_extraction(key, restaurant_style, menu_items)
+    return restaurant_style, menu_items
+
+def _store_extraction(key, restaurant_style, menu_items):
+    """Caches a successful extraction; failed ones are skipped so they are retried next time."""
+    if key and menu_items:
+        data = orjson.dumps({'restaurant_style': restaurant_style, 'items': menu_items})
+        _remember_extraction(key, data)
+        _extraction_disk.put(key, data)
+
+def _parse_menu(data):
+    """
+    Validates one decoded menu wrapper object.
+
+    Returns:
+        tuple: (restaurant_style: str, items: list)
+
+    Raises:
+        ValueError: If the wrapper or any item does not match the expected structure.
+    """
+    # Validate wrapper structure
+    if not isinstance(data, dict) or 'items' not in data or 'restaurant_style' not in data:
+        raise ValueError("Response is not a valid wrapper object with 'restaurant_style' and 'items'")
+
+    restaurant_style = data.get('restaurant_style', '')
+    menu_items = data['items']
+
+    if not isinstance(menu_items, list):
+        raise ValueError("'items' is not a JSON array")
+
+    for item in menu_items:
+        # One C-level subset check against the item's key view per item
+        if not isinstance(item, dict) or not _REQUIRED_FIELDS <= item.keys():
+            raise ValueError(f"Missing required fields in menu item: {item}")
+
+    return restaurant_style, menu_items
+
+def _request_menu_items(menu_contents):
     """
     Internal helper to call the Gemini API and extract menu items.
 
     Args:
-        contents: The contents to send to the Gemini API (list or string).
+        menu_contents: Menu page images (list) or menu text (str); SYSTEM_PROMPT is
+                       supplied by _menu_request.
 
     Returns:
         tuple: (restaurant_style: str, items: list) or ("", []) on failure.
     """
     try:
         api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            raise ValueError("Google API Key not found. Please set the GOOGLE_API_KEY environment variable.")
-
-        client = genai.Client(api_key=api_key)
+        client = get_client(api_key)
+        contents, config = _menu_request(menu_contents)
 
         # Generate response using Gemini 2.5 Flash with structured JSON output
         response = client.models.generate_content(
-            model='gemini-2.5-flash',
+            model=MENU_MODEL,
             contents=contents,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
-            )
+            config=config
         )
 
+        # response.text joins the response parts on every access, so read it once
+        text = response.text
+
         # Parse the JSON response
         try:
-            data = json.loads(response.text)
+            return _parse_menu(orjson.loads(text))
 
-            # Validate wrapper structure
-            if not isinstance(data, dict) or 'items' not in data or 'restaurant_style' not in data:
-                raise ValueError("Response is not a valid wrapper object with 'restaurant_style' and 'items'")
+        except orjson.JSONDecodeError as e:
+            logger.error("Failed to parse JSON response: %s", e)
+            logger.debug("Raw response: %s", text)
+            return "", []
 
-            restaurant_style = data.get('restaurant_style', '')
-            menu_items = data['items']
+    except Exception as e:
+        logger.error("Error extracting menu items: %s", e)
+        return "", []
 
-            if not isinstance(menu_items, list):
-                raise ValueError("'items' is not a JSON array")
+def draft_to_edge(image, max_edge=MAX_IMAGE_EDGE):
+    """
+    Asks a not-yet-loaded JPEG to decode at the smallest 1/2, 1/4 or 1/8 scale that
+    keeps its longest edge at or above max_edge. Other formats are left unchanged.
 
-            required_fields = ['name', 'description', 'price', 'ingredients', 'tags', 'prompt',
-                               'estimated_calories', 'protein_g', 'carbs_g', 'fat_g']
-            for item in menu_items:
-                if not all(field in item for field in required_fields):
-                    raise ValueError(f"Missing required fields in menu item: {item}")
+    Pillow picks the scale that keeps both sides at least as large as the requested
+    box, so the box follows the image's aspect ratio: a square box would be limited
+    by the short side and rarely allow any reduction for a landscape or portrait photo.
+    """
+    width, height = image.size
+    long_edge = max(width, height)
+    if long_edge > max_edge:
+        image.draft('RGB', (max(1, width * max_edge // long_edge), max(1, height * max_edge // long_edge)))
+    return image
 
-            return restaurant_style, menu_items
+def prepare_image(image_data, max_edge=MAX_IMAGE_EDGE):
+    """
+    Returns a menu photo sized for Gemini: longest edge capped at max_edge, RGB.
 
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON response: {e}")
-            print(f"Raw response: {response.text}")
-            return "", []
+    Phone photos are often 4000px+. Encoded bytes are decoded with draft(), so
+    JPEGs are scaled down by libjpeg during decoding. A PIL image that is passed
+    in is never modified.
 
-    except Exception as e:
-        print(f"Error extracting menu items: {e}")
-        return "", []
+    Args:
+        image_data: PIL Image object or image bytes
+        max_edge: Maximum width or height of the result, in pixels
+
+    Returns:
+        PIL.Image.Image: The prepared image.
+    """
+    if isinstance(image_data, (bytes, bytearray)):
+        image = draft_to_edge(Image.open(io.BytesIO(image_data)), max_edge)
+    else:
+        image = image_data
+
+    scale = max_edge / max(image.size)
+    if scale < 1:
+        image = image.resize((int(image.width * scale), int(image.height * scale)), Image.Resampling.LANCZOS)
+    return image.convert('RGB')
 
 def extract_menu_items_from_image(image_data):
     """
     Extracts menu items from an uploaded image using Google Gemini 2.5 Flash.
 
     Args:
-        image_data: PIL Image object or image bytes
+        image_data: PIL Image object or image bytes; downscaled with prepare_image
 
     Returns:
-        tuple: (restaurant_style: str, items: list)
+        tuple: (restaurant_style: str, items: list) or ("", []) on failure.
     """
-    return _extract_menu_items([SYSTEM_PROMPT, image_data])
+    try:
+        image = prepare_image(image_data)
+    except Exception as e:
+        logger.error("Error preparing menu image: %s", e)
+        return "", []
+    return _extract_menu_items([image])
 
 def extract_menu_items_from_text(menu_text):
     """
@@ -145,8 +379,186 @@ def extract_menu_items_from_text(menu_text):
     Returns:
         tuple: (restaurant_style: str, items: list)
     """
-    text_prompt = f"{SYSTEM_PROMPT}\n\nHere is the menu text to analyze:\n{menu_text}"
-    return _extract_menu_items(text_prompt)
+    return _extract_menu_items(menu_text)
+
+# Wraps several text menus into one request; the model answers with one wrapper per menu
+_BATCH_INSTRUCTION = (
+    "The text below contains {count} separate menus, each introduced by a '=== MENU n ===' line. "
+    "Analyze each menu independently and return ONLY a JSON array of exactly {count} objects, "
+    "one per menu in the same order, each in the JSON object format described above.\n\n"
+)
+
+def _batch_key(key):
+    """Cache key for a batched answer to the menu whose single-menu key is key."""
+    return hashlib.sha256(f"batch\x1f{key}".encode('utf-8')).hexdigest()
+
+def extract_menu_items_from_texts(menu_texts):
+    """
+    Extracts menu items from several plain-text menus with a single Gemini call.
+
+    Small menus (or menu sections pasted separately) each pay a full request round
+    trip and prompt prefill when extracted one by one; batching pays it once.
+    Menus already in the extraction cache are answered from it and left out of
+    the request. Batch answers come from a different prompt (the batch instruction,
+    with the other menus as context), so they are cached under their own keys and
+    never reused by the single-menu functions.
+
+    Args:
+        menu_texts: List of strings, each containing one menu's text
+
+    Returns:
+        list: One (restaurant_style: str, items: list) tuple per input, in order;
+              ("", []) for any menu that could not be extracted.
+    """
+    results = [("", []) for _ in menu_texts]
+    keys = [_extraction_key(text) for text in menu_texts]
+    batch_keys = [_batch_key(key) if key else None for key in keys]
+
+    pending = []
+    for i, key in enumerate(keys):
+        # A single-menu extraction is as good as a batched one; try it first
+        cached = (_cached_extraction(key) or _cached_extraction(batch_keys[i])) if key else None
+        if cached:
+            results[i] = cached
+        else:
+            pending.append(i)
+
+    if len(pending) == 1:
+        results[pending[0]] = _extract_menu_items(menu_texts[pending[0]])
+        return results
+    if not pending:
+        return results
+
+    sections = "\n".join(f"=== MENU {n} ===\n{menu_texts[i]}" for n, i in enumerate(pending, 1))
+    batch_text = _BATCH_INSTRUCTION.format(count=len(pending)) + sections
+
+    try:
+        api_key = os.getenv('GOOGLE_API_KEY')
+        client = get_client(api_key)
+        contents, config = _menu_request(batch_text, schema=_BATCH_SCHEMA)
+        response = client.models.generate_content(
+            model=MENU_MODEL,
+            contents=contents,
+            config=config
+        )
+
+        menus = orjson.loads(response.text)
+        if not isinstance(menus, list) or len(menus) != len(pending):
+            raise ValueError(f"Expected a JSON array of {len(pending)} menus")
+
+        # Each menu is validated on its own, so one malformed answer does not discard the rest
+        for i, data in zip(pending, menus):
+            try:
+                results[i] = _parse_menu(data)
+            except ValueError as e:
+                logger.error("Error extracting menu %d of batch: %s", i + 1, e)
+                continue
+            _store_extraction(batch_keys[i], *results[i])
+
+    except Exception as e:
+        logger.error("Error extracting batched menu items: %s", e)
+
+    return results
+
+# Header patterns stream_menu_items looks for before the items array opens
+_STYLE_RE = re.compile(r'"restaurant_style"\s*:\s*"([^"]*)"')
+_ITEMS_START_RE = re.compile(r'"items"\s*:\s*\[')
+
+# Characters that change parser state outside / inside a JSON string
+_STRUCTURE_RE = re.compile(r'[{}"]')
+_STRING_SPECIAL_RE = re.compile(r'["\\]')
+
+class ItemStreamParser:
+    """
+    Incrementally pulls complete JSON objects out of a streamed JSON array.
+
+    Each feed() call scans only the newly received text, tracking brace depth and
+    string/escape state, so total parse cost stays linear in the response size and
+    every object is decoded exactly once, the moment its closing brace arrives.
+    Scanning jumps between structural characters with precompiled regexes, so plain
+    text runs (names, descriptions, prompts) are skipped in C rather than per char.
+
+    Objects that close but fail to decode are dropped and counted in `skipped`;
+    `pending` is True while an object is still open (e.g. a truncated stream).
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.skipped = 0
+
+    @property
+    def pending(self) -> bool:
+        """True if the text fed so far ends inside an unfinished object."""
+        return self._depth > 0
+
+    def feed(self, text: str) -> list:
+        """
+        Consume the next chunk of streamed text.
+
+        Args:
+            text: Newly received text, positioned inside (or before) the array.
+
+        Returns:
+            list: Objects completed by this chunk, in order (may be empty).
+        """
+        items = []
+        if not text:
+            return items
+
+        pos = 0
+        segment_start = 0
+        if self._escaped:
+            # Previous chunk ended on a backslash inside a string: skip the escaped char
+            self._escaped = False
+            pos = 1
+
+        while True:
+            if self._depth == 0:
+                start = text.find('{', pos)
+                if start < 0:
+                    break
+                self._buffer = []
+                self._depth = 1
+                segment_start = start
+                pos = start + 1
+                continue
+
+            pattern = _STRING_SPECIAL_RE if self._in_string else _STRUCTURE_RE
+            match = pattern.search(text, pos)
+            if not match:
+                break
+            char = match.group()
+            pos = match.end()
+
+            if self._in_string:
+                if char == '\\':
+                    if pos >= len(text):
+                        self._escaped = True
+                        break
+                    pos += 1
+                else:
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._buffer.append(text[segment_start:pos])
+                    try:
+                        items.append(orjson.loads(''.join(self._buffer)))
+                    except orjson.JSONDecodeError:
+                        self.skipped += 1
+                    self._buffer = []
+
+        # Keep the unfinished object's text for the next chunk
+        if self._depth > 0:
+            self._buffer.append(text[segment_start:])
+        return items
 
 def stream_menu_items(contents):
     """
@@ -156,75 +568,85 @@ def stream_menu_items(contents):
     each one is complete, rather than waiting for the full response. This allows
     image generation to start for item #1 while OCR is still reading item #2.
 
+    Shares the extraction cache with the extract_menu_items_* functions: identical
+    input is replayed from it without calling Gemini, and a stream that completes
+    with every item intact is stored in it. Yielded items are copies, so callers
+    may attach image bytes to them without touching the cached extraction.
+
     Args:
-        contents: The contents to send to the Gemini API (list or string).
+        contents: Menu page images (list) or menu text (str), without SYSTEM_PROMPT;
+                  the prompt is sent as the system instruction.
 
     Yields:
         tuple: First yield is (restaurant_style: str, None).
                Subsequent yields are ("", item: dict) for each parsed menu item.
                Yields ("ERROR", None) if streaming fails.
     """
-    import re
+    key = _extraction_key(contents)
+    cached = _cached_extraction(key) if key else None
+    if cached:
+        restaurant_style, menu_items = cached
+        yield restaurant_style, None
+        for item in menu_items:
+            yield "", item
+        return
 
     try:
         api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            raise ValueError("Google API Key not found.")
-
-        client = genai.Client(api_key=api_key)
+        client = get_client(api_key)
+        request_contents, config = _menu_request(contents)
 
-        accumulated = ""
-        restaurant_style_yielded = False
+        # Text before the "items" array is kept only until the array opens;
+        # after that each chunk goes straight to the incremental parser.
+        header = ""
         restaurant_style = ""
-        item_buffer = ""
-        brace_depth = 0
-        in_items_array = False
+        restaurant_style_yielded = False
+        parser = None
+        menu_items = []
 
         for chunk in client.models.generate_content_stream(
-            model='gemini-2.5-flash',
-            contents=contents,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
-            )
+            model=MENU_MODEL,
+            contents=request_contents,
+            config=config
         ):
-            if not chunk.text:
+            text = chunk.text
+            if not text:
                 continue
-            accumulated += chunk.text
-
-            # Extract restaurant_style as soon as it appears in the stream
-            if not restaurant_style_yielded:
-                style_match = re.search(r'"restaurant_style"\s*:\s*"([^"]*)"', accumulated)
-                if style_match:
-                    restaurant_style = style_match.group(1)
-                    yield restaurant_style, None
-                    restaurant_style_yielded = True
-
-            # Once we locate the "items" array, track individual object boundaries
-            if not in_items_array:
-                if '"items"' in accumulated and '[' in accumulated.split('"items"', 1)[1]:
-                    in_items_array = True
-                    after_items = accumulated.split('"items"', 1)[1]
-                    accumulated = after_items[after_items.index('[') + 1:]
-
-            if in_items_array:
-                for char in chunk.text:
-                    if brace_depth == 0 and char == '{':
-                        item_buffer = "{"
-                        brace_depth = 1
-                    elif brace_depth > 0:
-                        item_buffer += char
-                        if char == '{':
-                            brace_depth += 1
-                        elif char == '}':
-                            brace_depth -= 1
-                            if brace_depth == 0:
-                                try:
-                                    item = json.loads(item_buffer)
-                                    yield "", item
-                                except json.JSONDecodeError:
-                                    pass
-                                item_buffer = ""
+
+            if parser is None:
+                header += text
+
+                # Extract restaurant_style as soon as it appears in the stream
+                if not restaurant_style_yielded:
+                    style_match = _STYLE_RE.search(header)
+                    if style_match:
+                        restaurant_style = style_match.group(1)
+                        yield restaurant_style, None
+                        restaurant_style_yielded = True
+
+                # Once we locate the "items" array, parse from just past its '['
+                items_match = _ITEMS_START_RE.search(header)
+                if not items_match:
+                    continue
+                parser = ItemStreamParser()
+                text = header[items_match.end():]
+                header = ""
+
+            for item in parser.feed(text):
+                menu_items.append(item)
+                yield "", dict(item)
 
     except Exception as e:
-        print(f"Streaming error: {e}")
-        yield "ERROR", None
\ No newline at end of file
+        logger.error("Streaming error: %s", e)
+        yield "ERROR", None
+        return
+
+    # A truncated stream or a dropped item would make a partial menu permanent
+    if parser is None or parser.pending or parser.skipped:
+        return
+    try:
+        _parse_menu({'restaurant_style': restaurant_style, 'items': menu_items})
+    except ValueError as e:
+        logger.warning("Not caching streamed extraction: %s", e)
+        return
+    _store_extraction(key, restaurant_style, menu_items)
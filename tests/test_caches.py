@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the on-disk cache, prompt cache keys and streamed JSON parser.
+Needs no API key or network access.
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+# Add parent directory to path so we can import from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.imaging_cache import DiskCache
+from src.imaging import _segment_key
+from src.vision import ItemStreamParser
+
+
+def _entries(cache):
+    """Returns {key: size} for every finished entry in a cache directory."""
+    found = {}
+    for shard in os.listdir(cache.directory):
+        for name in os.listdir(os.path.join(cache.directory, shard)):
+            if not name.endswith('.tmp'):
+                found[name] = os.path.getsize(os.path.join(cache.directory, shard, name))
+    return found
+
+
+def _age(cache, key, seconds):
+    """Backdates an entry's modification time by the given number of seconds."""
+    stamp = time.time() - seconds
+    os.utime(cache._path(key), (stamp, stamp))
+
+
+def test_disk_cache_size_limit():
+    """30 puts of 100 bytes never leave more than size_limit on disk, oldest go first"""
+    print("🧪 Testing DiskCache size limit...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskCache(directory, size_limit=1000)
+        keys = [f"{i:02d}{'k' * 62}" for i in range(30)]
+        for i, key in enumerate(keys):
+            cache.put(key, bytes(100))
+            # Older entries get older mtimes, so eviction order is deterministic
+            _age(cache, key, 1000 - i)
+            assert sum(_entries(cache).values()) <= 1000, f"over the limit after put {i + 1}"
+
+        remaining = _entries(cache)
+        assert keys[-1] in remaining, "newest entry was evicted"
+        assert keys[0] not in remaining, "oldest entry survived"
+        evicted = [key for key in keys if key not in remaining]
+        assert evicted == keys[:len(evicted)], "entries were not evicted oldest first"
+        assert cache.get(keys[-1]) == bytes(100)
+
+    print("✅ Cache stayed within its size limit")
+
+
+def test_disk_cache_eviction_target():
+    """Going over size_limit evicts down to 90% of it, not just below the limit"""
+    print("\n🧪 Testing DiskCache eviction target...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskCache(directory, size_limit=1000)
+        keys = [f"{i:02d}{'k' * 62}" for i in range(11)]
+        for i, key in enumerate(keys[:10]):
+            cache.put(key, bytes(100))
+            _age(cache, key, 1000 - i)
+        assert len(_entries(cache)) == 10, "entries evicted while at the limit"
+
+        cache.put(keys[10], bytes(100))
+        remaining = _entries(cache)
+        assert sum(remaining.values()) == 900, f"expected 900 bytes, found {sum(remaining.values())}"
+        assert keys[0] not in remaining and keys[1] not in remaining
+
+    print("✅ Eviction stopped at 90% of the limit")
+
+
+def test_disk_cache_expiry():
+    """Expired entries are misses and are removed by get() and sweep()"""
+    print("\n🧪 Testing DiskCache expiry...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskCache(directory, expire=60)
+        cache.put('aa-expired', b'old')
+        cache.put('bb-fresh', b'new')
+        cache.put('cc-swept', b'old')
+        _age(cache, 'aa-expired', 120)
+        _age(cache, 'cc-swept', 120)
+
+        assert cache.get('aa-expired') is None
+        assert not os.path.exists(cache._path('aa-expired')), "expired entry left on disk"
+        assert cache.get('bb-fresh') == b'new'
+
+        cache.sweep()
+        assert not os.path.exists(cache._path('cc-swept')), "sweep kept an expired entry"
+        assert cache.stats == {'hits': 1, 'misses': 1}
+
+    print("✅ Expired entries were dropped")
+
+
+def test_disk_cache_temp_cleanup():
+    """Sweeps delete temp files left by crashed writes, but not ones still being written"""
+    print("\n🧪 Testing DiskCache temp file cleanup...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskCache(directory)
+        cache.put('aa-entry', b'data')
+        shard = os.path.dirname(cache._path('aa-entry'))
+        stale = os.path.join(shard, 'stale.tmp')
+        active = os.path.join(shard, 'active.tmp')
+        for path in (stale, active):
+            with open(path, 'wb') as f:
+                f.write(bytes(50))
+        stamp = time.time() - 7200
+        os.utime(stale, (stamp, stamp))
+
+        cache.sweep()
+        assert not os.path.exists(stale), "stale temp file survived"
+        assert os.path.exists(active), "in-progress temp file was removed"
+        assert cache._size == 4, "temp files were counted towards the cache size"
+
+    print("✅ Only stale temp files were removed")
+
+
+def test_segment_key():
+    """Prompts differing only in case, punctuation or sentence order share a key"""
+    print("\n🧪 Testing prompt segment keys...")
+
+    base = "Professional food photography of ramen. Soft natural lighting. Shot from above."
+    assert _segment_key(base) == _segment_key("shot from above!  SOFT natural lighting. Professional food photography of ramen")
+    assert _segment_key(base) == _segment_key(base + " Soft natural lighting.")
+    assert _segment_key(base) != _segment_key(base.replace("ramen", "udon"))
+    assert '\x1f' not in _segment_key("3.5 oz steak"), "decimal point was read as a sentence break"
+    assert _segment_key("3.5 oz steak") != _segment_key("35 oz steak"), "different quantities share a key"
+    assert _segment_key("1/2 chicken") != _segment_key("12 chicken"), "different quantities share a key"
+    assert _segment_key("") == _segment_key(" ... ") == ""
+
+    print("✅ Segment keys normalised as expected")
+
+
+def _feed_all(chunks):
+    parser = ItemStreamParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return parser, items
+
+
+def test_item_stream_parser():
+    """Objects are decoded whole however the stream is split into chunks"""
+    print("\n🧪 Testing ItemStreamParser chunk boundaries...")
+
+    text = ('{"name": "Quote \\" and brace }", "tags": ["{", "}"]}, '
+            '{"name": "Back\\\\slash", "nested": {"a": {"b": 1}}}, '
+            '{"name": "Caf\\u00e9 {open"}]}')
+    expected = [
+        {'name': 'Quote " and brace }', 'tags': ['{', '}']},
+        {'name': 'Back\\slash', 'nested': {'a': {'b': 1}}},
+        {'name': 'Café {open'},
+    ]
+
+    # Every chunk size, including one character at a time
+    for size in range(1, len(text) + 1):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        parser, items = _feed_all(chunks)
+        assert items == expected, f"wrong items with {size}-character chunks"
+        assert not parser.pending and parser.skipped == 0
+
+    # An escape split exactly after its backslash
+    split = text.index('\\"') + 1
+    _, items = _feed_all([text[:split], text[split:]])
+    assert items == expected, "escape split across chunks was misread"
+
+    # Truncated and malformed objects
+    parser, items = _feed_all(['{"name": "a"}, {"name": "b", "x": 1'])
+    assert items == [{'name': 'a'}] and parser.pending
+    parser, items = _feed_all(['{"name": "a",}, {"name": "b"}'])
+    assert items == [{'name': 'b'}] and parser.skipped == 1
+
+    print("✅ Parser handled split escapes and braces inside strings")
+
+
+def main():
+    """Run all offline cache and parser tests"""
+    print("🚀 Starting offline cache tests...\n")
+
+    tests = [
+        ("DiskCache Size Limit", test_disk_cache_size_limit),
+        ("DiskCache Eviction Target", test_disk_cache_eviction_target),
+        ("DiskCache Expiry", test_disk_cache_expiry),
+        ("DiskCache Temp Cleanup", test_disk_cache_temp_cleanup),
+        ("Segment Keys", test_segment_key),
+        ("Item Stream Parser", test_item_stream_parser),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            test_func()
+            result = True
+        except AssertionError as e:
+            print(f"❌ {test_name} failed: {e}")
+            result = False
+        results.append((test_name, result))
+
+    # Summary
+    print("\n📊 Test Results Summary:")
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    for test_name, result in results:
+        status = "✅ PASSED" if result else "❌ FAILED"
+        print(f"   {test_name}: {status}")
+
+    print(f"\nOverall: {passed}/{total} tests passed")
+    return passed == total
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -6,7 +6,7 @@ Tests both text-to-text and image-to-text capabilities with JSON structured outp
 
 import os
 import sys
-import json
+import functools
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
@@ -15,9 +15,32 @@ from PIL import Image
 # Add parent directory to path so we can import from src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-
+from src.vision import ItemStreamParser, draft_to_edge
+
+# Structured-output schema for the menu extraction test: the model must return
+# exactly this shape, so the response always parses without any repair step
+_STRING = types.Schema(type=types.Type.STRING)
+MENU_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            'name': _STRING,
+            'description': _STRING,
+            'price': _STRING,
+            'ingredients': types.Schema(type=types.Type.ARRAY, items=_STRING),
+            'tags': types.Schema(type=types.Type.ARRAY, items=_STRING),
+            'prompt': _STRING,
+        },
+        required=['name', 'prompt'],
+        property_ordering=['name', 'description', 'price', 'ingredients', 'tags', 'prompt'],
+    ),
+)
+
+
+@functools.lru_cache(maxsize=1)
 def _get_client():
-    """Get a configured Gemini client."""
+    """Get a configured Gemini client, shared by every test in this run."""
     api_key = os.getenv('GOOGLE_API_KEY')
     if not api_key:
         print("❌ GOOGLE_API_KEY not found in environment variables")
@@ -82,15 +105,30 @@ def test_gemini_menu_extraction():
         Return ONLY the JSON array.
         """
 
-        response = client.models.generate_content(
+        # Stream the response and decode each item as soon as its closing brace arrives
+        parser = ItemStreamParser()
+        menu_items = []
+        for chunk in client.models.generate_content_stream(
             model='gemini-2.5-flash-lite',
             contents=f"{system_prompt}\n\nMenu text:\n{test_menu}",
             config=types.GenerateContentConfig(
                 response_mime_type='application/json',
+                response_schema=MENU_SCHEMA,
             )
-        )
+        ):
+            if chunk.text:
+                menu_items.extend(parser.feed(chunk.text))
+
+        # The parser drops objects it cannot decode, so check it actually got everything
+        if parser.skipped:
+            print(f"⚠️ Skipped {parser.skipped} malformed menu item(s)")
+        if parser.pending:
+            print("❌ Response ended inside an unfinished menu item")
+            return False
+        if not menu_items:
+            print("❌ No menu items could be parsed from the response")
+            return False
 
-        menu_items = json.loads(response.text)
         print("✅ Gemini Menu Extraction successful!")
         print(f"   Extracted {len(menu_items)} menu items:")
 
@@ -104,10 +142,6 @@ def test_gemini_menu_extraction():
 
         return True
 
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON parsing failed: {e}")
-        print(f"Raw response: {response.text}")
-        return False
     except Exception as e:
         print(f"❌ Gemini Menu Extraction test failed: {e}")
         return False
@@ -117,19 +151,16 @@ def test_gemini_image_to_text():
     """Test Gemini's image-to-text capabilities with example image"""
     print("\n🧪 Testing Gemini Image-to-Text...")
 
-    # Look for example images
+    # Look for example images with a single directory listing, in preference order
     examples_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'examples')
-    image_extensions = ['jpeg', 'jpg', 'png']
-    image_path = None
-
-    for ext in image_extensions:
-        for prefix in ['example', 'example_menu']:
-            path = os.path.join(examples_dir, f"{prefix}.{ext}")
-            if os.path.exists(path):
-                image_path = path
-                break
-        if image_path:
-            break
+    candidates = [f"{prefix}.{ext}" for ext in ['jpeg', 'jpg', 'png'] for prefix in ['example', 'example_menu']]
+
+    try:
+        with os.scandir(examples_dir) as entries:
+            files = {entry.name.lower(): entry.path for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        files = {}
+    image_path = next((files[name] for name in candidates if name in files), None)
 
     try:
         if not image_path:
@@ -143,6 +174,13 @@ def test_gemini_image_to_text():
         image = Image.open(image_path)
         print(f"   📸 Loaded image: {os.path.basename(image_path)} ({image.size} pixels)")
 
+        # Gemini downsamples large images anyway, so cap the long edge before upload.
+        # draft_to_edge() lets libjpeg decode straight to a 1/2, 1/4 or 1/8 scale (JPEG only)
+        draft_to_edge(image, 1536)
+        image.load()
+        image.thumbnail((1536, 1536), Image.Resampling.LANCZOS)
+        image = image.convert('RGB')
+
         response = client.models.generate_content(
             model='gemini-2.5-flash-lite',
             contents=[
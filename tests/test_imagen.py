@@ -6,6 +6,8 @@ Tests text-to-image generation capabilities.
 
 import os
 import sys
+import asyncio
+import functools
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
@@ -15,8 +17,9 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+@functools.lru_cache(maxsize=1)
 def _get_client():
-    """Get a configured Gemini client."""
+    """Get a configured Gemini client, shared by every test in this run."""
     api_key = os.getenv('GOOGLE_API_KEY')
     if not api_key:
         print("❌ GOOGLE_API_KEY not found in environment variables")
@@ -139,8 +142,61 @@ def test_imagen_food_generation():
         return False
 
 
+def _save_png(filepath, image_bytes):
+    """Write generated image bytes to disk."""
+    with open(filepath, 'wb') as f:
+        f.write(image_bytes)
+
+
+async def _generate_and_save(client, i, total, item, run_ts):
+    """Generate one test item with the async client and save it; returns True on success."""
+    print(f"\n🍽️  Generating image {i}/{total}: {item['name']}")
+
+    try:
+        response = await client.aio.models.generate_images(
+            model='imagen-4.0-fast-generate-001',
+            prompt=item['prompt'],
+            config=types.GenerateImagesConfig(
+                number_of_images=1,
+                aspect_ratio='1:1',
+            )
+        )
+
+        if response.generated_images:
+            image_bytes = response.generated_images[0].image.image_bytes
+            print(f"✅ {item['name']} generated successfully!")
+
+            safe_name = item['name'].lower().replace(' ', '_')
+            filename = f"test_{safe_name}_{run_ts}_{i}.png"
+            filepath = os.path.join(os.path.dirname(__file__), filename)
+
+            # Keep file I/O off the event loop
+            await asyncio.to_thread(_save_png, filepath, image_bytes)
+
+            print(f"💾 Saved as: {filename}")
+            return True
+
+        print(f"❌ Failed to generate {item['name']}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Error generating {item['name']}: {e}")
+        return False
+
+
+async def _generate_items_concurrently(client, items):
+    """Run every test item's generation at once; returns the number that succeeded."""
+    # One timestamp per run; the item index keeps filenames unique
+    run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results = await asyncio.gather(*(
+        _generate_and_save(client, i, len(items), item, run_ts)
+        for i, item in enumerate(items, 1)
+    ))
+    return sum(results)
+
+
 def test_imagen_multiple_items():
-    """Test generating multiple food items (like our app would do)"""
+    """Test generating multiple food items concurrently (like our app would do)"""
     print("\n🧪 Testing Multiple Food Item Generation...")
 
     try:
@@ -159,41 +215,8 @@ def test_imagen_multiple_items():
             }
         ]
 
-        successful_generations = 0
-
-        for i, item in enumerate(test_items, 1):
-            print(f"\n🍽️  Generating image {i}/{len(test_items)}: {item['name']}")
-            print("⏳ Generating...")
-
-            try:
-                response = client.models.generate_images(
-                    model='imagen-4.0-fast-generate-001',
-                    prompt=item['prompt'],
-                    config=types.GenerateImagesConfig(
-                        number_of_images=1,
-                        aspect_ratio='1:1',
-                    )
-                )
-
-                if response.generated_images:
-                    image_bytes = response.generated_images[0].image.image_bytes
-                    print(f"✅ {item['name']} generated successfully!")
-
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    safe_name = item['name'].lower().replace(' ', '_')
-                    filename = f"test_{safe_name}_{timestamp}.png"
-                    filepath = os.path.join(os.path.dirname(__file__), filename)
-
-                    with open(filepath, 'wb') as f:
-                        f.write(image_bytes)
-
-                    print(f"💾 Saved as: {filename}")
-                    successful_generations += 1
-                else:
-                    print(f"❌ Failed to generate {item['name']}")
-
-            except Exception as e:
-                print(f"❌ Error generating {item['name']}: {e}")
+        print("⏳ Generating all items concurrently...")
+        successful_generations = asyncio.run(_generate_items_concurrently(client, test_items))
 
         print(f"\n📊 Successfully generated {successful_generations}/{len(test_items)} images")
 